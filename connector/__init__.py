@@ -2,7 +2,10 @@ import os
 import json
 import requests
 import logging
+import threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
 '''Connect the server and algorithms by Kafka.'''
 
@@ -13,23 +16,52 @@ class HttpPoster():
     properties
     ----------
     url: str, http上报的url
+    session: requests.Session, 当前线程的长连接会话, 同一线程的各次上报复用其连接池
+    maxWorkers: int, 并发上报的最大线程数
     用法:
     poster = HttpPoster(url)
     poster.run(data)
+    poster.close()
     将data上报到url
     '''
     def __init__(self, url, deviceID: str = None, deviceType: int = 0,
-                 level=logging.DEBUG):
+                 level=logging.DEBUG, maxWorkers: int = 16):
         '''function __init__
 
         input
         -----
         url: str, http上报的url
+        maxWorkers: int, 并发上报的最大线程数, 避免请求过多压垮服务器
         '''
         self.url = url
+        self.maxWorkers = maxWorkers
+        # 复用会话, 避免每次上报都重新建立TCP/TLS连接
+        # requests.Session不保证线程安全, 每个线程各自持有一个会话
+        self._local = threading.local()
+        self._sessions = []     # 已创建的全部会话, 用于close时统一关闭
+        self._sessionsLock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=maxWorkers)
         if deviceID is not None:
             self._initHttpLogger(deviceID, deviceType, level)
 
+    @property
+    def session(self) -> requests.Session:
+        '''property session
+
+        返回当前线程的会话, 首次访问时创建
+        '''
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update({'Content-Type': 'application/json'})
+            adapter = HTTPAdapter(pool_maxsize=1)   # 单线程使用, 保持一个连接即可
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._local.session = session
+            with self._sessionsLock:
+                self._sessions.append(session)
+        return session
+
     def _initHttpLogger(self, deviceID: str, deviceType: int = 200,
                         level=logging.DEBUG):
         self.logger = logging.getLogger(deviceID + '_' + str(deviceType))
@@ -43,12 +75,7 @@ class HttpPoster():
         ch.setLevel(logging.ERROR)
         self.logger.addHandler(ch)
         # 文件日志
-        logsDir = './logger/logs'
-        if not os.path.exists(logsDir):     # 判断两层文件夹是否存在
-            os.mkdir(logsDir)
-        deviceDir = f'{logsDir}/{self.logger.name}'
-        if not os.path.exists(deviceDir):
-            os.mkdir(deviceDir)
+        os.makedirs(f'./logger/logs/{self.logger.name}', exist_ok=True)
         filePath = f'./logger/logs/{deviceID}_{str(deviceType)}/' + \
             f'http-{datetime.now().strftime("%Y-%m-%d")}.log'
         fh = logging.FileHandler(filePath, encoding='utf-8')
@@ -64,11 +91,13 @@ class HttpPoster():
         events: list, 需要上报的事件列表
 
         将事件列表中的事件以POST形式上传给http.
-        按照协议要求, 逐个上报
+        按照协议要求, 逐个上报, 多个事件时并发上报以重叠网络等待时间
         '''
-        for event in events:
-            self.postData(event)
-        pass
+        if len(events) <= 1:
+            for event in events:
+                self.postData(event)
+            return
+        list(self._executor.map(self.postData, events))
 
     def postData(self, data: dict) -> requests.Response:
         '''function run
@@ -81,8 +110,7 @@ class HttpPoster():
         '''
         # r = requests.post(self.url, data=data)
         # r = requests.post(self.url, json=data)
-        headers = {'Content-Type': 'application/json'}
-        r = requests.post(self.url, headers=headers, data=json.dumps(data))
+        r = self.session.post(self.url, data=json.dumps(data), timeout=5.0)
         self.logger.debug(f"Post data: {data}")
         if r.status_code // 100 != 2:
             print(f"Failed to upload data, status code: {r.status_code}")
@@ -92,3 +120,14 @@ class HttpPoster():
             except ValueError:
                 print(r.text)  # If the response body is not JSON, print
         return r
+
+    def close(self):
+        '''function close
+
+        关闭线程池与各线程的会话, 释放连接池中的连接
+        '''
+        self._executor.shutdown(wait=True)
+        with self._sessionsLock:
+            for session in self._sessions:
+                session.close()
+            self._sessions.clear()
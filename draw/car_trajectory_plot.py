@@ -1,5 +1,6 @@
 import os
 import time
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.cm as cm
@@ -12,6 +13,9 @@ plt.rcParams['axes.unicode_minus'] = False
 # plt.rcParams['figure.figsize'] = (12.0, 8.0)
 plt.rcParams['figure.dpi'] = 300
 plt.rcParams['savefig.dpi'] = 300
+# 大量散点时简化路径, 减少保存图片的耗时
+plt.rcParams['path.simplify'] = True
+plt.rcParams['path.simplify_threshold'] = 1.0
 
 
 def drawTimespace(data: pd.DataFrame, saveDir: str, suffix: str = '',
@@ -49,85 +53,139 @@ def drawTimespace(data: pd.DataFrame, saveDir: str, suffix: str = '',
     data = data[data[colFrame] < maxFrameNum]   # 只观察前maxFrameNum帧
     data[colV] = data[colV] * 3.6 if v_trans else data[colV]   # 速度单位转换为km/h
     data = data.reset_index(drop=True)
-    for lane, laneGroup in data.groupby(data[colLane]):
-        plt.figure(figsize=(20, 6))
-        for _, carTraj in laneGroup.groupby(laneGroup[colCarID]):
-            # 速度取绝对值，以免速度方向与指定方向相反而带有负号
-            carTraj[colV] = carTraj[colV].abs()
-            plt.scatter(carTraj[colFrame], carTraj[colLocation],
-                        c=list(carTraj[colV]), cmap=cm.rainbow_r, s=1)
-        plt.title("lane %d" % lane)
-        plt.colorbar()
-        plt.savefig(saveDir +
+    # 各车道复用同一figure, 每条车道画图前清空axes
+    # 已按车道排序, 直接在车道变化处切分, 无需groupby
+    laneArr = data[colLane].to_numpy()
+    bounds = np.flatnonzero(np.diff(laneArr)) + 1
+    fig, ax = plt.subplots(figsize=(20, 6))
+    for idx in np.split(np.arange(len(data)), bounds):
+        if len(idx) == 0:
+            continue
+        laneGroup = data.iloc[idx[0]:idx[-1] + 1]
+        lane = laneArr[idx[0]]
+        ax.cla()
+        # 整条车道一次性画出, 避免逐车调用scatter
+        # 速度取绝对值，以免速度方向与指定方向相反而带有负号
+        sc = ax.scatter(laneGroup[colFrame], laneGroup[colLocation],
+                        c=laneGroup[colV].abs().to_numpy(),
+                        cmap=cm.rainbow_r, s=1, rasterized=True)
+        ax.set_title("lane %d" % lane)
+        cb = fig.colorbar(sc, ax=ax)
+        fig.savefig(saveDir +
                     f"/{deviceID}_id-{carID}_{suffix}_lane-{lane}.jpg",
                     dpi=300)
-        plt.close()
+        cb.remove()
+    plt.close(fig)
 
 
 singleCarEventTypes = ["stop", "lowSpeed", "highSpeed", "emgcBrake",
                        "illegalOccupation"]
 laneEventTypes = ["spill", "crowd"]
+# drawTimespace默认按位置索引使用前tsColNum列, 事件匹配另需eventDataCols列
+tsColNum = 11
+eventDataCols = ['deviceID', 'id', 'lane', 'timestamp']
+# 读取时即指定较窄的数据类型, 减少后续分组与画图时的内存占用
+eventDataDtypes = {'id': 'int32', 'lane': 'int16', 'timestamp': 'int64',
+                   'x': 'float32', 'y': 'float32',
+                   'vx': 'float32', 'vy': 'float32'}
 
 
-def getEventData(excelDf: pd.DataFrame, dataDf: pd.DataFrame, type: str):
+def getEventData(eventRec: dict, idGroups: dict, laneGroups: dict,
+                 type: str):
     '''function getEventData
 
     input
     -----
-    excelDf: pd.DataFrame, excel事件表, 仅一行数据
-    dataDf: pd.DataFrame, 轨迹数据表
+    eventRec: dict, excel事件表的一行记录
+    idGroups: dict, 按车辆id分组的轨迹数据表, 键为id
+    laneGroups: dict, 按车道分组的轨迹数据表, 键为车道号
     type: str, 事件类别
 
     return
     ------
     data: pd.DataFrame, 事件相关数据
 
-    根据事件类别获取事件相关数据
+    根据事件类别获取事件相关数据, 无相关数据时返回空表
     '''
+    emptyDf = pd.DataFrame()
     # 对于单车事件, 直接获取
     if type in singleCarEventTypes:
-        return dataDf[dataDf['id'] == int(excelDf['id'])]
+        return idGroups.get(int(eventRec['id']), emptyDf)
     elif type in laneEventTypes:
-        return dataDf[dataDf['lane'] == excelDf['start_lane']]
+        return laneGroups.get(eventRec['start_lane'], emptyDf)
     elif type == "incident":
-        carIDs = [int(x) for x in excelDf['id'].split(',')]
-        df1 = dataDf[dataDf['id'] == carIDs[0]]
-        df2 = dataDf[dataDf['id'] == carIDs[1]]
+        carIDs = [int(x) for x in eventRec['id'].split(',')]
+        df1 = idGroups.get(carIDs[0], emptyDf)
+        df2 = idGroups.get(carIDs[1], emptyDf)
         return pd.concat([df1, df2])
 
 
+def _initDrawWorker():
+    '''function _initDrawWorker
+
+    进程池子进程的初始化函数
+    子进程仅保存图片, 使用Agg后端, 无需显示环境
+    '''
+    plt.switch_backend('Agg')
+
+
+def _drawEvent(job: tuple):
+    '''function _drawEvent
+
+    input
+    -----
+    job: tuple, (eventData, imgDirPath, suffix), 单个事件的画图任务
+
+    进程池中执行的单个事件画图任务
+    '''
+    eventData, imgDirPath, suffix = job
+    drawTimespace(eventData, imgDirPath, suffix=suffix)
+
+
 def drawExcelEventCarIDTrajectory(
         excelPath: str, dataPath: str,
-        typeList: list = ['stop', 'incident', 'spill']):
+        typeList: list = ['stop', 'incident', 'spill'],
+        maxWorkers: int = None):
     '''function drawExcelEventCarIDTrajectory
 
     input
     -----
     excelPath: str, excel事件报警文件路径
     dataPath: str, 轨迹数据文件路径
+    typeList: list, 需要画图的事件类别
+    maxWorkers: int, 画图进程数, 默认为None即CPU核数
 
     return
     ------
     None
 
-    从excel文件中读取数据, 画出指定事件类别的车辆轨迹图
+    从excel文件中读取数据, 画出指定事件类别的车辆轨迹图。
+    各事件的图相互独立, 以进程池并行绘制。
     '''
     # 读取excel文件
     eventDf = pd.read_excel(excelPath)
-    dataDf = pd.read_csv(dataPath)
-    dataDf['lane'] = dataDf['lane'].apply(lambda x: x - 100 if x > 100 else x)
+    # 仅读取需要的列, 保留前tsColNum列以保证drawTimespace的位置索引不变
+    header = pd.read_csv(dataPath, nrows=0).columns
+    usecols = list(header[:tsColNum]) + \
+        [col for col in header[tsColNum:] if col in eventDataCols]
+    dataDf = pd.read_csv(dataPath, usecols=usecols, dtype=eventDataDtypes)
+    lanes = dataDf['lane'].to_numpy()
+    dataDf['lane'] = lanes - np.where(lanes > 100, 100, 0).astype(lanes.dtype)
+    # 按id与车道预先分组, 各事件查找数据时无需重复扫描整表
+    idGroups = dict(list(dataDf.groupby('id', sort=False)))
+    laneGroups = dict(list(dataDf.groupby('lane', sort=False)))
     imgDirPath = excelPath.replace('.xlsx', '_images').replace(
         '.csv', 'images')
-    if not os.path.exists(imgDirPath):
-        os.makedirs(imgDirPath)
+    os.makedirs(imgDirPath, exist_ok=True)
     # 画图
-    for i in range(eventDf.shape[0]):
-        type = eventDf['type'].iloc[i]
+    jobs = []
+    for rec in eventDf.to_dict('records'):
+        type = rec['type']
         if type not in typeList:
             continue
-        deviceID = eventDf['deviceID'].iloc[i]
-        eventID = eventDf['eventID'].iloc[i]
-        eventData = getEventData(eventDf.iloc[i], dataDf, type)
+        deviceID = rec['deviceID']
+        eventID = rec['eventID']
+        eventData = getEventData(rec, idGroups, laneGroups, type)
         if len(eventData) == 0:
             print(f'no data for deviceID {deviceID} eventID {eventID}')
             continue
@@ -135,7 +193,10 @@ def drawExcelEventCarIDTrajectory(
         startTime = eventData['timestamp'].min() / 1000     # s为单位
         timeStr = time.strftime(
             "%Y-%m-%d %H-%M-%S", time.localtime(startTime))
-        drawTimespace(eventData, imgDirPath, suffix=type + '_' + timeStr)
+        jobs.append((eventData, imgDirPath, type + '_' + timeStr))
+    with ProcessPoolExecutor(max_workers=maxWorkers,
+                             initializer=_initDrawWorker) as executor:
+        list(executor.map(_drawEvent, jobs))
 
 
 def drawTimespaceIdColor(
@@ -177,19 +238,28 @@ def drawTimespaceIdColor(
     data = data[data[colFrame] < maxFrameNum]   # 只观察前maxFrameNum帧
     data[colV] = data[colV] * 3.6 if v_trans else data[colV]   # 速度转为km/h
     data = data.reset_index(drop=True)
-    for lane, laneGroup in data.groupby(data[colLane]):
-        plt.figure(figsize=(20, 6))
-        for _, carTraj in laneGroup.groupby(laneGroup[colCarID]):
-            # 速度取绝对值，以免速度方向与指定方向相反而带有负号
-            carTraj[colV] = carTraj[colV].abs()
-            plt.scatter(carTraj[colFrame], carTraj[colLocation],
-                        c=[idColor[id] for id in carTraj[colCarID]], s=1)
-        plt.title("lane %d" % lane)
-        plt.colorbar()
-        plt.savefig(saveDir +
+    # 各车道复用同一figure, 每条车道画图前清空axes
+    # 已按车道排序, 直接在车道变化处切分, 无需groupby
+    laneArr = data[colLane].to_numpy()
+    bounds = np.flatnonzero(np.diff(laneArr)) + 1
+    fig, ax = plt.subplots(figsize=(20, 6))
+    for idx in np.split(np.arange(len(data)), bounds):
+        if len(idx) == 0:
+            continue
+        laneGroup = data.iloc[idx[0]:idx[-1] + 1]
+        lane = laneArr[idx[0]]
+        ax.cla()
+        # 整条车道一次性画出, 按id映射颜色, 避免逐车调用scatter
+        colors = np.array(laneGroup[colCarID].map(idColor).tolist())
+        sc = ax.scatter(laneGroup[colFrame], laneGroup[colLocation],
+                        c=colors, s=1, rasterized=True)
+        ax.set_title("lane %d" % lane)
+        cb = fig.colorbar(sc, ax=ax)
+        fig.savefig(saveDir +
                     f"/{deviceID}_id-{carID}_{suffix}_lane-{lane}.jpg",
                     dpi=300)
-        plt.close()
+        cb.remove()
+    plt.close(fig)
 
 
 if __name__ == "__main__":
@@ -233,7 +303,6 @@ if __name__ == "__main__":
     for dataPath in dataPathList:
         data = pd.read_csv(dataPath)
         saveDir = dataPath.replace('.csv', '_images')
-        if not os.path.exists(saveDir):
-            os.makedirs(saveDir)
+        os.makedirs(saveDir, exist_ok=True)
         drawTimespace(data, saveDir)
         print(f'{dataPath} done.')
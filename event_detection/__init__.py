@@ -126,8 +126,11 @@ class EventDetector(TrafficMng):
         # 清空上一帧事件信息
         self.currentIDs = []
         self.eventMng.clear()   # 清空事件管理器
-        # 更新交通流信息
-        self.update(cars)
+        # 更新交通流信息, 检测抛洒物时同时更新元胞危险度
+        if 'spill' in self.eventTypes:
+            self.tick(cars)
+        else:
+            self.update(cars)
         # 检测交通事件
         self.updatePotentialDict(cars)
         self.detect(cars)
@@ -202,7 +205,7 @@ class EventDetector(TrafficMng):
         # 设备信息
         deviceID = cars[0]['deviceID']
         deviceType = cars[0]['deviceType']
-        self.updateDanger()     # 更新危险度
+        # 危险度已在run中由tick随缓存一并更新
         # 检查是否存在抛洒物可能
         for id in self.lanes:
             for order in self.lanes[id].cells:
@@ -72,9 +72,4 @@ class MyLogger(logging.Logger):
         '''function _checkLogsDir
 
         检查日志文件夹是否存在，不存在则创建'''
-        logsDir = './logger/logs'
-        if not os.path.exists(logsDir):
-            os.mkdir(logsDir)
-        deviceDir = f'{logsDir}/{self.name}'
-        if not os.path.exists(deviceDir):
-            os.mkdir(deviceDir)
+        os.makedirs(f'./logger/logs/{self.name}', exist_ok=True)
@@ -94,27 +94,31 @@ def main():
     logger.info('算法组件生成成功, 数据进入算法通道.')
 
     # 持续性运行接收
-    for msgBytes in kc:
-        # 数据解码
-        msgStr = msgBytes.value.decode('utf-8')
-        msg = json.loads(msgStr)        # dict
-        # 非空数据判断
-        if isInvalidMsg(msg) or isNotTargetDevice(msg, args):
-            continue
-        if (len(msg) == 0) or (len(msg['targets']) == 0):
-            continue
-        dataTime = unixMilliseconds2Datetime(msg['targets'][0]['timestamp'])
-        print('latest receiving time:', datetime.now(),
-              ' dataTime: ', dataTime,
-              f'{args.deviceId}_{args.deviceType}', end='\r')
-        # log文件保存更新
-        logger.updateDayLogFile()
-        # 算法检测
-        msg, events = controller.run(msg)
-        if (events is None) or (len(events) == 0):
-            continue    # 未检测到事件
-        # 上报事件
-        hp.run(events)
+    try:
+        for msgBytes in kc:
+            # 数据解码
+            msgStr = msgBytes.value.decode('utf-8')
+            msg = json.loads(msgStr)        # dict
+            # 非空数据判断
+            if isInvalidMsg(msg) or isNotTargetDevice(msg, args):
+                continue
+            if (len(msg) == 0) or (len(msg['targets']) == 0):
+                continue
+            dataTime = unixMilliseconds2Datetime(
+                msg['targets'][0]['timestamp'])
+            print('latest receiving time:', datetime.now(),
+                  ' dataTime: ', dataTime,
+                  f'{args.deviceId}_{args.deviceType}', end='\r')
+            # log文件保存更新
+            logger.updateDayLogFile()
+            # 算法检测
+            msg, events = controller.run(msg)
+            if (events is None) or (len(events) == 0):
+                continue    # 未检测到事件
+            # 上报事件
+            hp.run(events)
+    finally:
+        hp.close()     # 释放上报线程池与连接
 
 
 def simulatedMainGrouped(dataPath: str):
@@ -314,32 +318,36 @@ def mainGrouped():
     logger.info('算法组件生成成功, 数据进入算法通道.')
 
     # 持续性运行接收
-    for msgBytes in kc:
-        # 数据解码
-        msgStr = msgBytes.value.decode('utf-8')
-        msg = json.loads(msgStr)        # dict
-        # 非空数据判断
-        if isInvalidMsg(msg):   # 注意顺序, 在msg获取deviceID等属性前判断, 防止报错
-            continue
-        if (len(msg) == 0) or (len(msg['targets']) == 0):
-            continue
-        deviceID, deviceType = msg['deviceID'], str(msg['deviceType'])
-        name = deviceID + '_' + deviceType
-        dataTime = unixMilliseconds2Datetime(msg['targets'][0]['timestamp'])
-        print('latest receiving time:', datetime.now(),
-              ' dataTime: ', dataTime, name, end='\r')   # 持续显示
-        # 当前消息的设备
-        if name not in controllerGroup:
-            logger.error('该设备未在config中设置, 请添加.' + name)
-            continue
-        # log文件保存更新
-        controllerGroup[name].logger.updateDayLogFile()
-        # 算法检测
-        msg, events = controllerGroup[name].run(msg)
-        if (events is None) or (len(events) == 0):
-            continue    # 未检测到事件
-        # 上报事件
-        hp.run(events)
+    try:
+        for msgBytes in kc:
+            # 数据解码
+            msgStr = msgBytes.value.decode('utf-8')
+            msg = json.loads(msgStr)        # dict
+            # 非空数据判断
+            if isInvalidMsg(msg):   # 注意顺序, 在msg获取deviceID等属性前判断, 防止报错
+                continue
+            if (len(msg) == 0) or (len(msg['targets']) == 0):
+                continue
+            deviceID, deviceType = msg['deviceID'], str(msg['deviceType'])
+            name = deviceID + '_' + deviceType
+            dataTime = unixMilliseconds2Datetime(
+                msg['targets'][0]['timestamp'])
+            print('latest receiving time:', datetime.now(),
+                  ' dataTime: ', dataTime, name, end='\r')   # 持续显示
+            # 当前消息的设备
+            if name not in controllerGroup:
+                logger.error('该设备未在config中设置, 请添加.' + name)
+                continue
+            # log文件保存更新
+            controllerGroup[name].logger.updateDayLogFile()
+            # 算法检测
+            msg, events = controllerGroup[name].run(msg)
+            if (events is None) or (len(events) == 0):
+                continue    # 未检测到事件
+            # 上报事件
+            hp.run(events)
+    finally:
+        hp.close()     # 释放上报线程池与连接
 
 
 if __name__ == "__main__":
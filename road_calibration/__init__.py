@@ -1,18 +1,29 @@
+import math
 import yaml
 import numpy as np
+from road_calibration.lane_buffer import LaneBuffer
 from road_calibration.algorithms import (
     dbi, calQuartiles, poly2fit, poly2fitFrozen, cutPts)
 
 
+# 标定所需的车辆目标字段, 用于批量接收的结构化数组
+# xy采用float64, 以保证标定结果的起终点与原始数据一致
+targetDtype = np.dtype([('laneID', 'i4'), ('x', 'f8'), ('y', 'f8'),
+                        ('vx', 'f4'), ('vy', 'f4')])
+
+
 class Calibrator():
     '''class Calibrator
 
     properties
     ----------
     xyByLane: dict
-        按lane存储xy。
-    vxyCount: dict
-        存储所有vxy的正负计数, 每一次x/y对应的正速度+1, 负速度-1。
+        按lane存储xy, 值为LaneBuffer。
+    vxyCount: np.ndarray
+        存储所有vxy的正负计数, shape=(maxLaneID+1, 2), 以laneID为行索引,
+        两列分别对应x与y, 每一次x/y对应的正速度+1, 负速度-1。
+    bufFrames: int
+        接收数据的缓冲帧数, 每隔bufFrames帧将缓冲数据批量整理到xyByLane与vxyCount。
     calibration: dict
         存储标定结果。包括: 应急车道号, 车道线方程, 元胞划分直线方程, 合流元胞编号。
 
@@ -20,6 +31,8 @@ class Calibrator():
     -------
     run(msg)
         接受每帧传输来的目标信息, 更新给calibrator
+    runBatch(arr)
+        接受每帧以结构化数组表示的目标信息, 更新给calibrator
     calibrate()
         根据存储的数据计算标定结果。
     save(path)
@@ -30,7 +43,8 @@ class Calibrator():
 
     def __init__(self, clbPath: str, fps: float,
                  laneWidth: float = 3.75, emgcWidth: float = 3.5,
-                 cellLen: float = 50.0, qMerge: float = 0):
+                 cellLen: float = 50.0, qMerge: float = 0,
+                 bufFrames: int = 100):
         '''class function __init__
 
         input
@@ -47,6 +61,8 @@ class Calibrator():
             元胞长度。
         qMerge: float
             判定元胞为合流区域的流量, 小于qMerge判定该cell不可用。
+        bufFrames: int
+            接收数据的缓冲帧数, 达到后批量整理缓冲数据。
 
         生成标定器, 用于标定检测区域的有效行驶片区和应急车道。
         '''
@@ -58,9 +74,11 @@ class Calibrator():
         self.cellLen = cellLen                  # 元胞长度
         self.qMerge = qMerge                    # 判定元胞为合流区域的流量
         self.count = 0                          # 计数
+        self.bufFrames = bufFrames              # 缓冲帧数
         # 暂存传感器数据
-        self.xyByLane = dict()                  # lane索引的xy
-        self.vxyCount = dict()                  # lane索引的vxy的正负计数
+        self._buf = []                          # 缓冲的各帧结构化数组
+        self.xyByLane = dict()                  # lane索引的xy(LaneBuffer)
+        self.vxyCount = np.zeros((0, 2), dtype=np.int64)  # vxy的正负计数
         # 车道ID与运动正方向
         self.laneIDs = []
         self.emgcIDs = []
@@ -68,8 +86,8 @@ class Calibrator():
         # 车道线方程
         self.xyMinMax = dict()                  # lane索引的xy的最大最小值
         self.globalXYMinMax = []    # 全局xy最大最小值[xmin,max, ymin,max]
-        self.polyPts = dict()                     # lane索引的四分位特征点
-        self.coef = dict()                        # lane索引的曲线方程系数
+        self.polyPts = np.empty((0, 5, 2))      # lane索引的四分位特征点
+        self.coef = np.empty((0, 3))            # lane索引的曲线方程系数
         # 元胞
         self.cells = dict()                       # lane索引的元胞有效无效列表
 
@@ -81,34 +99,67 @@ class Calibrator():
         msg: list
             list, 代码内流通的数据格式。msg元素为代表一个车辆目标的dict。
 
-        接受每帧传输来的目标信息, 更新给calibrator
+        接受每帧传输来的目标信息, 更新给calibrator。
+        每帧将目标信息转为结构化数组后交给runBatch。
+        '''
+        arr = np.fromiter(
+            ((t['laneID'], t['x'], t['y'], t['vx'], t['vy']) for t in msg),
+            dtype=targetDtype, count=len(msg))
+        self.runBatch(arr)
+
+    def runBatch(self, arr: np.ndarray):
+        '''class function runBatch
+
+        input
+        ----------
+        arr: np.ndarray
+            含targetDtype各字段的结构化数组, 元素为一个车辆目标。
+
+        接受每帧以结构化数组表示的目标信息, 更新给calibrator。
+        缓冲时复制并转换为targetDtype, 调用方可在各帧复用同一数组。
         '''
         self.count += 1
-        for target in msg:
-            laneID = target['laneID'] - 100 if target['laneID'] > 100 \
-                else target['laneID']
+        self._buf.append(np.array(arr, dtype=targetDtype))
+        if self.count % self.bufFrames == 0:
+            self._flush()
 
-            # 分配dict索引()
+    def _flush(self):
+        '''class function _flush
+
+        将缓冲的目标数据批量整理到xyByLane与vxyCount。
+        以ndarray按lane分组, vxy的正负计数以np.sign求和, 避免逐目标判断。
+        '''
+        if len(self._buf) == 0:
+            return
+        arr = np.concatenate(self._buf)
+        self._buf = []
+        if len(arr) == 0:
+            return
+        laneIDs = arr['laneID']
+        laneIDs = np.where(laneIDs > 100, laneIDs - 100, laneIDs)
+        # 更新vxyCount, 按laneID行索引一次性累加所有目标的速度符号
+        rows = laneIDs.max() + 1
+        if rows > len(self.vxyCount):
+            self.vxyCount = np.pad(self.vxyCount,
+                                   ((0, rows - len(self.vxyCount)), (0, 0)))
+        signs = np.column_stack((np.sign(arr['vx']), np.sign(arr['vy'])))
+        np.add.at(self.vxyCount, laneIDs, signs.astype(np.int64))
+        # 存储xy, 按lane稳定排序后分段, 保持各lane内的接收顺序
+        lanes, inverse = np.unique(laneIDs, return_inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.cumsum(np.bincount(inverse))[:-1]
+        for laneID, idx in zip(lanes.tolist(), np.split(order, bounds)):
             if laneID not in self.xyByLane:
-                self.xyByLane[laneID] = []
-                self.vxyCount[laneID] = {'x': 0, 'y': 0}
-            # 存储vxy
-            self.xyByLane[laneID].append([target['x'], target['y']])
-            # 更新vxyCount
-            if target['vx'] > 0:
-                self.vxyCount[laneID]['x'] += 1
-            elif target['vx'] < 0:
-                self.vxyCount[laneID]['x'] -= 1
-            if target['vy'] > 0:
-                self.vxyCount[laneID]['y'] += 1
-            elif target['vy'] < 0:
-                self.vxyCount[laneID]['y'] -= 1
+                self.xyByLane[laneID] = LaneBuffer()
+            self.xyByLane[laneID].appendBatch(arr['x'][idx], arr['y'][idx])
 
     def calibrate(self):
         '''class function calibrate
 
         根据calibrator的属性计算标定结果。
         '''
+        # 整理尚未处理的缓冲数据
+        self._flush()
         # 确定车道ID
         self._distinguishNormalAndEmgcLanes()
         # 标定内外侧车道线ID
@@ -166,7 +217,8 @@ class Calibrator():
         '''
         # 考量紧急车道内侧的2个车道, 点分散程度大的的车道为外侧车道
         lane2, laneN_1 = self.emgcIDs[0] + 1, self.emgcIDs[1] - 1
-        dbi2, dbiN_1 = dbi(self.xyByLane[lane2]), dbi(self.xyByLane[laneN_1])
+        dbi2 = dbi(self.xyByLane[lane2].points())
+        dbiN_1 = dbi(self.xyByLane[laneN_1].points())
         if dbi2 < dbiN_1:
             self.intID, self.extID = lane2, laneN_1
         else:
@@ -185,9 +237,9 @@ class Calibrator():
             if id in self.emgcIDs:
                 continue    # 跳过应急车道, 轨迹点数量少不具有代表性
             dir = {'x': 1, 'y': 1}
-            if self.vxyCount[id]['x'] < 0:
+            if self.vxyCount[id, 0] < 0:
                 dir['x'] = -1
-            if self.vxyCount[id]['y'] < 0:
+            if self.vxyCount[id, 1] < 0:
                 dir['y'] = -1
             self.vDirDict[id] = dir
         # 确定应急车道速度正方向
@@ -203,43 +255,42 @@ class Calibrator():
     def _calibXYMinMax(self):
         '''class function _calibXYMinMax
 
-        对各lane的xyByLane分别以x或y排序, 得到最大最小值, 存储到self.xyMinMax。
+        对各lane的xyByLane分别求x与y的最大最小值, 存储到self.xyMinMax。
         self.xyMinMax索引为laneID, 值为[xmin, xmax, ymin, ymax]。
-        并对所有lane得到的xyMinMax再次排序, 得到最大最小值, 存储到self.globalXYMinMax。
+        并对所有lane得到的xyMinMax再求最大最小值, 存储到self.globalXYMinMax。
         self.globalXYMinMax值为[xmin, xmax, ymin, ymax]。
         '''
         self.xyMinMax = dict()
-        self.globalXYMinMax = [0, 0, 0, 0]
-        # 对各lane的xyByLane分别以x或y排序, 得到最大最小值, 存储到self.xyMinMax
+        # 对各lane的xyByLane分别求最大最小值, 存储到self.xyMinMax
         for lane in self.xyByLane:
-            # 以x排序
-            self.xyByLane[lane].sort(key=lambda x: x[0])
-            xmin, xmax = self.xyByLane[lane][0][0], self.xyByLane[lane][-1][0]
-            # 以y排序
-            self.xyByLane[lane].sort(key=lambda x: x[1])
-            ymin, ymax = self.xyByLane[lane][0][1], self.xyByLane[lane][-1][1]
+            buf = self.xyByLane[lane]
+            xs, ys = buf.xs[:buf.n], buf.ys[:buf.n]
+            xmin, xmax = xs.min().item(), xs.max().item()
+            ymin, ymax = ys.min().item(), ys.max().item()
             # 存储
             self.xyMinMax[lane] = [xmin, xmax, ymin, ymax]
-            self.globalXYMinMax[0] = min(self.globalXYMinMax[0], xmin)
-            self.globalXYMinMax[1] = max(self.globalXYMinMax[1], xmax)
-            self.globalXYMinMax[2] = min(self.globalXYMinMax[2], ymin)
-            self.globalXYMinMax[3] = max(self.globalXYMinMax[3], ymax)
+        # 对所有lane的xyMinMax按列求最大最小值(与0比较, 全局范围包含原点)
+        mm = np.vstack(list(self.xyMinMax.values()))
+        self.globalXYMinMax = [min(0, mm[:, 0].min().item()),
+                               max(0, mm[:, 1].max().item()),
+                               min(0, mm[:, 2].min().item()),
+                               max(0, mm[:, 3].max().item())]
 
     def _getLaneQuartilesPoints(self) -> dict:
         '''class function _getLaneQuartilesPoints
 
         return
         ----------
-        polyPts: dict
-            返回车道特征点, dict格式, {laneID: [list]}。
+        polyPts: np.ndarray
+            返回车道特征点, shape=(maxLaneID+1, 5, 2), 以laneID为索引。
             元素为一个lane轨迹点的四分位特征点, shape=(5, 2)。
+            应急车道不计算特征点, 其值为nan。
         '''
-        self.polyPts = dict()
+        self.polyPts = np.full((max(self.laneIDs) + 1, 5, 2), np.nan)
         for id in self.laneIDs:
             if id in self.emgcIDs:
                 continue
-            featPoints = calQuartiles(self.xyByLane[id])
-            self.polyPts.update({id: featPoints})
+            self.polyPts[id] = calQuartiles(self.xyByLane[id].points())
 
     def _calculateLanesFunction(self):
         '''class function _calculateLanesFunction
@@ -247,13 +298,14 @@ class Calibrator():
         return
         ----------
 
-        利用存储的轨迹点信息, 计算车道特征点, 拟合出车道方程
+        利用存储的轨迹点信息, 计算车道特征点, 拟合出车道方程。
+        self.coef以laneID为索引, shape=(maxLaneID+1, 3)。
         '''
         # 拟合laneExt车道线方程
-        self.coef = dict()
+        self.coef = np.full((max(self.laneIDs) + 1, 3), np.nan)
         # 实验验证: 采用四分位特征点拟合效果优于直接用轨迹点拟合
-        extCoef = poly2fit(np.array(self.polyPts[self.extID]))
-        # extCoef = poly2fit(np.array(self.xyByLane[self.extID]))
+        extCoef = poly2fit(self.polyPts[self.extID])
+        # extCoef = poly2fit(self.xyByLane[self.extID].points())
         self.coef[self.extID] = extCoef
 
         # 拟合其他非应急车道的车道线方程
@@ -262,33 +314,30 @@ class Calibrator():
                 continue
             # 以extCoef为初始值拟合
             # 实验验证: 采用四分位特征点拟合效果优于直接用轨迹点拟合
-            a = poly2fitFrozen(np.array(self.polyPts[id]), extCoef[0])
-            # a = poly2fitFrozen(np.array(self.xyByLane[id]), extCoef[0])
+            a = poly2fitFrozen(self.polyPts[id], extCoef[0])
+            # a = poly2fitFrozen(self.xyByLane[id].points(), extCoef[0])
             self.coef[id] = a
 
         # 拟合应急车道的车道线方程
         intCoef = self.coef[self.intID]
         d = (self.laneWidth + self.emgcWidth) / 2   # 边界车道-应急车道距离
-        # 计算ext车道线方程系数的导数
-        diffCoef = np.polyder(np.poly1d(extCoef))
-        # 计算在x=0处的导数值（切线的k值）
-        k = np.polyval(diffCoef, 0)
+        # ext车道线在x=0处的导数值（切线的k值）, 即一次项系数
+        k = float(extCoef[1])
         # 计算边界车道-应急车道距离在y轴上的投影距离
-        dY = d * np.sqrt(1 + k**2)
-        # 计算应急车道的车道线方程系数
-        if self.coef[self.extID][2] > self.coef[self.intID][2]:
-            aExtEmgc = [extCoef[0], extCoef[1], extCoef[2] + dY]
-            aIntEmgc = [intCoef[0], intCoef[1], intCoef[2] - dY]
+        dY = d * math.sqrt(1.0 + k * k)
+        # 计算应急车道的车道线方程系数, 与相邻车道仅常数项相差dY
+        offset = np.array([0, 0, dY])
+        if self.coef[self.extID, 2] > self.coef[self.intID, 2]:
+            aExtEmgc, aIntEmgc = extCoef + offset, intCoef - offset
         else:
-            aExtEmgc = [extCoef[0], extCoef[1], extCoef[2] - dY]
-            aIntEmgc = [intCoef[0], intCoef[1], intCoef[2] + dY]
+            aExtEmgc, aIntEmgc = extCoef - offset, intCoef + offset
         # 存储应急车道的车道线方程系数
         if self.intID == self.emgcIDs[0] + 1:
-            self.coef[self.emgcIDs[0]] = np.array(aIntEmgc)
-            self.coef[self.emgcIDs[1]] = np.array(aExtEmgc)
+            self.coef[self.emgcIDs[0]] = aIntEmgc
+            self.coef[self.emgcIDs[1]] = aExtEmgc
         else:
-            self.coef[self.emgcIDs[0]] = np.array(aExtEmgc)
-            self.coef[self.emgcIDs[1]] = np.array(aIntEmgc)
+            self.coef[self.emgcIDs[0]] = aExtEmgc
+            self.coef[self.emgcIDs[1]] = aIntEmgc
 
     def _calibCells(self):
         '''class function _calibCells
@@ -308,14 +357,11 @@ class Calibrator():
         # 各lane将xy点分配到元胞顺序计数
         cellCount = dict()
         for id in self.laneIDs:
-            count = [0] * cellNum
-            self.xyByLane.setdefault(id, [])
-            for xy in self.xyByLane[id]:
-                if len(xy):
-                    # 根据y大于等于划分点的数量, 确定元胞编号
-                    order = np.sum(xy[1] >= pts) - 1
-                    count[order] += 1
-            cellCount[id] = count
+            buf = self.xyByLane.setdefault(id, LaneBuffer(0))
+            # 根据y大于等于划分点的数量, 确定元胞编号
+            orders = np.searchsorted(pts, buf.ys[:buf.n], side='right') - 1
+            np.clip(orders, 0, cellNum - 1, out=orders)
+            cellCount[id] = np.bincount(orders, minlength=cellNum)
 
         for id in self.laneIDs:
             if id in self.emgcIDs:
@@ -328,11 +374,12 @@ class Calibrator():
             #     valid.append(True if q > self.qMerge else False)
             # 法2: 计算各元胞经过车辆数占该车道总车辆数的比例
             # 比例小于 1 / cellNum / 5 判定为不可用
-            valid = [True if x / sum(cellCount[id]) > 1 / cellNum / 5
-                     else False for x in cellCount[id]]
+            # 即 count / total > 1 / (cellNum * 5), 两侧同乘以整数比较
+            cnt = cellCount[id]
+            valid = (cnt * (cellNum * 5) > cnt.sum()).tolist()
             # 对于y运动方向为负的车道, 元胞列表反向(默认从ymin到ymax划分为正向)
             if self.vDirDict[id]['y'] < 0:
-                valid.reverse()
+                valid = valid[::-1]
             self.cells[id] = valid
         # 将应急车道的cell全部设为False
         for id in self.emgcIDs:
@@ -361,7 +408,7 @@ class Calibrator():
                        'start': start,
                        'len': abs(start - end),
                        'end': end,
-                       'coef': [round(x*1000)/1000 for x in self.coef[id]],
+                       'coef': np.round(self.coef[id], 3).tolist(),
                        'cells': self.cells[id]
                        }
             clb.update({id: laneClb})
@@ -20,18 +20,18 @@ def calQuartiles(points: list, range: float = 3) -> list:
     计算一组数据点的四分位点, 采用四分位点附近范围内的点的均值。
     将用于车道线拟合。
     '''
-    y_values = [point[1] for point in points]
-    q0 = np.percentile(y_values, 0)
-    q1 = np.percentile(y_values, 25)
-    q2 = np.percentile(y_values, 50)
-    q3 = np.percentile(y_values, 75)
-    q4 = np.percentile(y_values, 100)
+    points = np.asarray(points, dtype=float)
+    y_values = points[:, 1]
+    qs = np.percentile(y_values, [0, 25, 50, 75, 100])
 
     result = []
-    for q in [q0, q1, q2, q3, q4]:
-        nearby_points = [p for p in points if abs(p[1] - q) <= range]
-        avg_x = sum([point[0] for point in nearby_points]) / len(nearby_points)
-        avg_y = sum([point[1] for point in nearby_points]) / len(nearby_points)
+    for q in qs:
+        nearby_points = points[np.abs(y_values - q) <= range]
+        # 空数组求均值只会得到nan, 需显式报错, 避免nan进入车道线拟合系数
+        if len(nearby_points) == 0:
+            raise ZeroDivisionError(
+                f'no points within range={range} of quartile y={q}')
+        avg_x, avg_y = nearby_points.mean(axis=0).tolist()
         result.append([avg_x, avg_y])
 
     return result
@@ -0,0 +1,78 @@
+import numpy as np
+
+
+class LaneBuffer():
+    '''class LaneBuffer
+
+    properties
+    ----------
+    xs: np.ndarray
+        x坐标缓冲数组, 前n个元素有效。
+    ys: np.ndarray
+        y坐标缓冲数组, 前n个元素有效。
+    n: int
+        已存储的点数量。
+    capacity: int
+        缓冲数组容量, 容量不足时翻倍扩充。
+
+    methods
+    -------
+    appendBatch(xs, ys)
+        批量追加一组点的xy坐标。
+    points()
+        返回已存储的点, shape=(n, 2)。
+
+    按lane存储轨迹点的xy坐标, x与y分别存为连续数组(SoA),
+    相比以list存储[x, y]占用内存更少, 且便于向量化计算。
+    '''
+
+    def __init__(self, capacity: int = 1024, dtype=np.float64):
+        '''class function __init__
+
+        input
+        ----------
+        capacity: int
+            初始容量。
+        dtype: np.dtype
+            坐标数据类型。标定结果的起终点直接取自轨迹点坐标,
+            默认采用float64以保证与原始数据一致。
+        '''
+        self.xs = np.empty(capacity, dtype=dtype)
+        self.ys = np.empty(capacity, dtype=dtype)
+        self.n = 0
+        self.capacity = capacity
+
+    def __len__(self) -> int:
+        return self.n
+
+    def appendBatch(self, xs: np.ndarray, ys: np.ndarray):
+        '''class function appendBatch
+
+        input
+        ----------
+        xs: np.ndarray
+            一组点的x坐标, shape=(m,)
+        ys: np.ndarray
+            一组点的y坐标, shape=(m,)
+
+        批量追加一组点, 容量不足时翻倍扩充, 均摊复杂度为O(1)。
+        '''
+        m = len(xs)
+        if self.n + m > self.capacity:
+            capacity = max(self.capacity * 2, self.n + m)
+            self.xs = np.resize(self.xs, capacity)
+            self.ys = np.resize(self.ys, capacity)
+            self.capacity = capacity
+        self.xs[self.n:self.n + m] = xs
+        self.ys[self.n:self.n + m] = ys
+        self.n += m
+
+    def points(self) -> np.ndarray:
+        '''class function points
+
+        return
+        ----------
+        points: np.ndarray
+            已存储的点, shape=(n, 2), 列分别为x, y。
+        '''
+        return np.column_stack((self.xs[:self.n], self.ys[:self.n]))
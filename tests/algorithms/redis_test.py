@@ -3,13 +3,16 @@ import time
 import os
 from multiprocessing import Process
 
-# 连接 Redis
-redis_client = redis.StrictRedis(host='localhost', port=6379, db=0)
+# 连接 Redis, 共享连接池以复用连接
+_pool = redis.ConnectionPool(host='localhost', port=6379, db=0,
+                             max_connections=32)
+redis_client = redis.StrictRedis(connection_pool=_pool)
 
 
 def acquire_lock(lock_name, acquire_timeout=10):
     """ 尝试获取锁 """
-    lock = redis_client.lock(lock_name, timeout=acquire_timeout)
+    lock = redis_client.lock(lock_name, timeout=acquire_timeout,
+                             thread_local=False)
     acquired = lock.acquire(blocking=True)
     return lock if acquired else None
 
@@ -1,6 +1,8 @@
 from rsu_simulator import Smltor
 from message_driver import Driver
-from road_calibration import Calibrator
+from road_calibration import Calibrator, targetDtype
+from road_calibration.lane_buffer import LaneBuffer
+import numpy as np
 import yaml
 from tests.test_data.standardClb import standardClb
 
@@ -53,5 +55,96 @@ def test_calibrator():
     assert clb == standardClb
 
 
+def test_runBatchLaneFold():
+    '''test function runBatch
+
+    测试批量接收时, 车道号大于100的目标归并到原车道。
+    '''
+    calibrator = Calibrator('', fps=20, bufFrames=1)
+    arr = np.array([(2, 1.0, 10.0, 0.5, 5.0),
+                    (102, 2.0, 20.0, -0.5, 6.0),
+                    (3, 3.0, 30.0, 0.0, -7.0)], dtype=targetDtype)
+    calibrator.runBatch(arr)
+
+    # 检查点1
+    # 102号车道的目标归入2号车道, 不单独建立车道
+    assert sorted(calibrator.xyByLane.keys()) == [2, 3]
+    assert calibrator.xyByLane[2].points().tolist() == \
+        [[1.0, 10.0], [2.0, 20.0]]
+    # 检查点2
+    # vxy正负计数同样按归并后的车道累加
+    assert calibrator.vxyCount[2].tolist() == [0, 2]
+    assert calibrator.vxyCount[3].tolist() == [0, -1]
+
+
+def test_runBatchFlushOrder():
+    '''test function runBatch
+
+    测试每隔bufFrames帧批量整理缓冲数据, 且各车道内保持接收顺序。
+    '''
+    calibrator = Calibrator('', fps=20, bufFrames=2)
+    frames = [[(1, 0.0, 0.0, 1.0, 1.0), (2, 5.0, 0.0, 1.0, 1.0)],
+              [(2, 5.0, 1.0, 1.0, 1.0), (1, 0.0, 1.0, 1.0, 1.0)],
+              [(1, 0.0, 2.0, 1.0, 1.0)]]
+    calibrator.runBatch(np.array(frames[0], dtype=targetDtype))
+
+    # 检查点1
+    # 未达到bufFrames时不整理
+    assert calibrator.xyByLane == {}
+    calibrator.runBatch(np.array(frames[1], dtype=targetDtype))
+
+    # 检查点2
+    # 达到bufFrames时整理, 各车道内按接收顺序排列
+    assert calibrator.xyByLane[1].points()[:, 1].tolist() == [0.0, 1.0]
+    assert calibrator.xyByLane[2].points()[:, 1].tolist() == [0.0, 1.0]
+    calibrator.runBatch(np.array(frames[2], dtype=targetDtype))
+    calibrator._flush()     # calibrate时整理剩余缓冲
+
+    # 检查点3
+    # 剩余数据追加在已整理数据之后
+    assert calibrator.xyByLane[1].points()[:, 1].tolist() == \
+        [0.0, 1.0, 2.0]
+
+
+def test_runBatchReuseArray():
+    '''test function runBatch
+
+    测试调用方在各帧复用同一数组时, 已缓冲的帧不受影响。
+    '''
+    calibrator = Calibrator('', fps=20, bufFrames=2)
+    arr = np.array([(2, 1.0, 10.0, 1.0, 1.0)], dtype=targetDtype)
+    calibrator.runBatch(arr)
+    arr['y'] = 99.0
+    calibrator.runBatch(arr)
+
+    # 检查点1
+    # 第一帧保持接收时的数值
+    assert calibrator.xyByLane[2].points().tolist() == \
+        [[1.0, 10.0], [1.0, 99.0]]
+
+
+def test_laneBufferGrow():
+    '''test function LaneBuffer.appendBatch
+
+    测试LaneBuffer超出容量时扩充, 且已存储的点保持不变。
+    '''
+    buf = LaneBuffer(capacity=2)
+    buf.appendBatch(np.array([0.0, 1.0]), np.array([10.0, 11.0]))
+    buf.appendBatch(np.array([2.0]), np.array([12.0]))
+
+    # 检查点1
+    # 容量翻倍
+    assert buf.capacity == 4
+    # 检查点2
+    # 单次追加超过翻倍容量时, 扩充到所需容量
+    buf.appendBatch(np.arange(3.0, 10.0), np.arange(13.0, 20.0))
+    assert buf.capacity == 10
+    assert len(buf) == 10
+    # 检查点3
+    # 全部点按追加顺序保存
+    assert buf.points().tolist() == \
+        [[float(i), float(i + 10)] for i in range(10)]
+
+
 if __name__ == '__main__':
     test_calibrator()
@@ -43,5 +43,64 @@ def testManager():
             assert tm.Q == 0
 
 
+# 通过
+def testManagerTick():
+    '''test function tick
+
+    测试tick与依次调用update, updateDanger的结果一致。
+    '''
+    configPath = './config.yml'
+    clbPath = './road_calibration/clbymls/clb.yml'
+    dataPath = './data/result.txt'
+
+    # 读取配置文件和标定文件
+    with open(configPath, 'r') as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+    with open(clbPath, 'r') as f:
+        clb = yaml.load(f, Loader=yaml.FullLoader)
+    # 放大危险度增长, 使danger累积与前向r2传递均能发生
+    config['tTolerance'] = 2
+    config['vLateral'] = 0.3
+    config['rate2'] = 0.1
+    config['calInterval'] = 5
+    # 生成仿真器
+    sm = Smltor(dataPath)
+    # 生成驱动器
+    d = Driver(config['fps'])
+    # 生成两个路口管理器, 分别以两种方式更新
+    tmStep = TrafficMng(clb, config)
+    tmTick = TrafficMng(clb, config)
+    frameNum = 0
+    while frameNum < 2000:
+        msg = sm.run()
+        if msg == '':
+            break
+        valid, cars = d.receive(msg)
+        if not valid:
+            continue
+        frameNum += 1
+        tmStep.update(cars)
+        tmStep.updateDanger()
+        tmTick.tick(cars)
+        # 检查点1
+        # 路段流量与各元胞交通参数, danger一致
+        assert tmTick.Q == tmStep.Q
+        for id in tmStep.lanes:
+            for order in tmStep.lanes[id].cells:
+                cellStep = tmStep.lanes[id].cells[order]
+                cellTick = tmTick.lanes[id].cells[order]
+                assert cellTick.q == cellStep.q
+                assert cellTick.r1 == cellStep.r1
+                assert cellTick.danger == cellStep.danger
+        tmStep.resetCellDetermineStatus()
+        tmTick.resetCellDetermineStatus()
+    # 检查点2
+    # 测试过程中出现了danger累积
+    assert any(cell.danger > 0
+               for lane in tmTick.lanes.values()
+               for cell in lane.cells.values())
+
+
 if __name__ == '__main__':
     testManager()
+    testManagerTick()
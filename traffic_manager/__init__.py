@@ -8,6 +8,7 @@ class TrafficMng():
     交通流计算类, 根据传感器信息计算交通流。
     对外接口函数: `update(cars), updateDanger()`, 返回值为None。
     实现tm对车辆进行按帧缓存, 并每隔一定时间计算交通流参数。
+    需要每帧更新危险度时, 调用`tick(cars)`代替update与updateDanger。
 
     Attributes
     ----------
@@ -89,15 +90,53 @@ class TrafficMng():
         接收传感器数据, 更新缓存, 一定时间更新交通流参数。
         该方法不直接返回数据, 各层次的交通数据通过直接调用实例本身获取。
         '''
+        vxByLane = self._updateStats(cars)
+        # 更新各车道元胞最新一帧的状态
+        for id in self.lanes:
+            self.lanes[id].updateCellsLastFrame(vxByLane[id])
+
+    def tick(self, cars: list):
+        '''function tick
+
+        input
+        -----
+        cars: list, 传感器数据, cars元素为代表一个车辆目标的dict。
+
+        每帧调用一次, 效果等同依次调用update与updateDanger。
+        更新统计量与交通流参数后, 由各车道在一次遍历中同时更新元胞缓存与danger。
+        '''
+        vxByLane = self._updateStats(cars)
+        # 更新元胞缓存与danger, 需在R1更新之后
+        for id in self.lanes:
+            self.lanes[id].tick(vxByLane[id])
+
+    def _updateStats(self, cars: list) -> dict:
+        '''function _updateStats
+
+        input
+        -----
+        cars: list, 传感器数据, cars元素为代表一个车辆目标的dict。
+
+        return
+        ------
+        vxByLane: dict
+            键为车道id, 值为该车道updateStats返回的按元胞组织的车辆vx
+
+        更新计数与各车道的滑动窗口统计量, 到达计算间隔时更新交通流参数与R1。
+        update与tick共用。
+        '''
         self.count += 1
         self.count %= self.itv  # 重置计数, count仅用于判断计算交通流的时机, 达到后即可置零
 
-        # 更新缓存数据
-        self._updateCache(cars)
+        # 按车道组织车辆, 更新各车道统计量
+        carsByLane = self._carsByLane(cars)  # dict按车道组织, 无车则空列表
+        vxByLane = {id: self.lanes[id].updateStats(carsByLane[id])
+                    for id in self.lanes}
         if self.count % self.itv == 0:
             self._updateTraffic()
             self._updateR1()    # 更新路段q后, 重新计算cell的抛洒物置信度时间增长率R1
             # print(self.Q, end=', ')
+        return vxByLane
 
     def updateDanger(self):
         '''function updateDanger
@@ -115,21 +154,6 @@ class TrafficMng():
         for id in self.lanes:
             self.lanes[id].resetCellDetermineStatus()
 
-    def _updateCache(self, cars: list):
-        '''function _updateCache
-
-        input
-        -----
-        cars: list, 传感器数据, cars元素为代表一个车辆目标的dict。
-
-        仅更新缓存数据, 增加新数据, 删除过期数据。
-        '''
-        # 按车道组织车辆
-        carsByLane = self._carsByLane(cars)  # dict按车道组织, 无车则空列表
-        # 更新至各车道缓存
-        for id in self.lanes:
-            self.lanes[id].updateCache(carsByLane[id])
-
     def _updateTraffic(self):
         '''function _updateTraffic
 
@@ -1,8 +1,11 @@
 class CellMng:
     '''class Cell
     实例化道路元胞
-    对外接口函数: `updateCache(cars), updateTraffic(), updateDanger()`。
-    被laneMng调用, 用于每帧更新各个元胞的缓存, 每隔指定时间更新交通参数。
+    对外接口函数: `updateLastFrame(vx), updateDanger()`。
+    被laneMng调用, 用于每帧更新各个元胞的最新帧状态与危险度。
+    元胞不缓存车辆数据, updateLastFrame仅设置updateDanger所需的最新帧状态。
+    元胞交通参数由laneMng以数组形式对整条车道的元胞统一计算,
+    元胞的q, k, v, aveCarNum仅为读取车道数组中对应元素的属性。
 
     Attributes
     ----------
@@ -18,34 +21,49 @@ class CellMng:
         元胞起始位置
     end : float
         元胞结束位置
+    lane : LaneMng
+        元胞所在车道的管理器, 元胞交通参数存储于其数组中
     q : float
-        元胞流量, 单位: veh/h
+        元胞流量, 单位: veh/h, 只读
     k : float
-        元胞密度, 单位: veh/km
+        元胞密度, 单位: veh/km, 只读
     v : float
-        元胞速度, 单位: m/s(计算q时, 注意调整单位为km/h)
+        元胞速度, 单位: m/s(计算q时, 注意调整单位为km/h), 只读
+    aveCarNum : float
+        元胞帧平均车辆数, 只读
     r1s : float
         rate1 standard, 元胞默认随时间减小的置信度标准值
     r1 : float
-        rate1, 元胞默认随时间增长的置信度, 按r1s * q / qs更新
+        rate1, 元胞默认随时间增长的置信度, 按r1s * q / qs更新,
+        由laneMng统一计算存于其_r1List列表, 只读
     r2 : float
         rate2, 过大横向速度和换道导致的前向元胞置信度增加值
     vLat : float
         lateral velocity, 横向速度阈值(认定前方可能有抛洒物), 单位: m/s
     danger : float
-        元胞存在抛洒物的危险性
-    cache : list
-        元胞缓存车辆实例, 按接收顺序索引
-        TODO: 直接缓存车辆整个信息会不会炸内存? 还是只缓存必要信息?
-    cacheRet: int
-        cache retention, 缓存最长时间, 超出此时间的缓存被清除, 单位: 帧
+        元胞存在抛洒物的危险性, 为dangerTime与dangerChange之和, 只读
+    _lastN: int
+        最新一帧的车辆数
+    _lastHasFast: bool
+        最新一帧是否有车辆横向速度超过vLat, 在updateLastFrame时确定
+        danger判断只需最新一帧的状态, vy已由laneMng计入车道的滑动窗口统计量,
+        因此元胞不再缓存历史帧的车辆数据。
+        不可用(valid为False)的元胞不更新danger, laneMng不再为其更新状态。
     r2added: bool
-        每帧更新r2是否被加, 加上了就不再加了, 每帧更新r2时重置为False
+        每帧更新r2是否被加, 加上了就不再加了, 每帧更新r2时重置为False,
+        存于laneMng的_r2added数组, 只读
     '''
+    # 元胞实例数量多且每帧访问, 固定属性以减少内存并加快属性读写
+    __slots__ = ('laneID', 'order', 'valid', 'len', 'start', 'end',
+                 'lane',
+                 'r1s', 'qs', '_r1Factor', 'r2', 'vLat',
+                 'dangerTime', 'dangerChange', 'dangerTimeTop',
+                 '_lastN', '_lastHasFast')
+
     def __init__(self, laneID: int, order: int, valid: bool,
                  len: float, start: float, end: float,
                  tt: float, fps: float, qs: float, r2: float, vLat: float,
-                 cacheRet: float):
+                 lane):
         '''function __init__
 
         input
@@ -72,8 +90,8 @@ class CellMng:
             rate2, 过大横向速度和换道导致的前向元胞置信度增加值
         vLat : float
             lateral velocity, 横向速度阈值(认定前方可能有抛洒物), 单位: m/s
-        cacheRet: int
-            cache retention, 缓存最长时间, 超出此时间的缓存被清除, 单位: 帧
+        lane : LaneMng
+            元胞所在车道的管理器
         '''
         # 基础属性
         self.laneID = laneID
@@ -82,62 +100,70 @@ class CellMng:
         self.len = len
         self.start = start
         self.end = end
-        # 交通参数
-        self.q = 0
-        self.k = 0
-        self.v = 0
-        self.aveCarNum = 0  # 帧平均车辆数
+        # 交通参数由所在车道统一计算
+        self.lane = lane
         # 置信度
         self.r1s = 1 / tt / fps
         self.qs = qs
-        self.r1 = 0
+        self._r1Factor = self.r1s / qs  # 预先计算, 更新r1时只需一次乘法
         self.r2 = r2
         self.vLat = vLat
         self.dangerTime = 0.0       # 时间增长积累的danger
         self.dangerChange = 0.0     # 车辆换道积累的danger
-        self.danger = self.dangerTime + self.dangerChange   # 外部调用
         self.dangerTimeTop = 0.5    # 时间增长积累的danger上限
-        # 缓存
-        self.cache = []    # list内按顺序索引, 用dict反而会有遍历的消耗
-        self.cacheRet = cacheRet
-        # 每帧更新r2是否被加, 加上了就不再加了, 每帧更新r2时重置为False
-        self.r2added = False
+        # 最新一帧的状态, updateLastFrame时确定, 供updateDanger直接读取
+        self._lastN = 0
+        self._lastHasFast = False
 
-    def updateCache(self, cars: list):
-        '''function update
+    def updateLastFrame(self, vx):
+        '''function updateLastFrame
 
         input
         -----
-        cars: list
-            车辆列表, 每个元素为一个dict, 代表一个车辆目标
-
-        1. 更新元胞缓存, 将已确定归属于该元胞的车辆目标, 更新到cache中。
-        2. 要更新danger。
-        若当前帧没有车辆处于该cell, 则以空占位,
-        保证在没有时间戳索引的情况下, 能够用list自身的索引代替时间戳,
-        空数据能够占位代表过去了1个时间戳。
+        vx: np.ndarray or list
+            该元胞当前帧各车辆的横向速度, shape=(n,)
+
+        设置最新一帧的车辆数, 及是否有车辆横向速度超过vLat, 仅供updateDanger使用。
+        元胞q, k, v由laneMng.updateStats统计, 不经过此函数。
+        由laneMng将车辆按元胞投影为速度列表后调用, 元胞内不逐车访问dict。
         '''
-        # 缓存
-        self.cache.append(cars)
-        # 检查缓存长度, 清除过期缓存
-        if len(self.cache) > self.cacheRet:
-            self.cache.pop(0)
-
-    def updateTraffic(self):
-        # 确定缓存数据量
-        baseT = len(self.cache) if len(self.cache) < self.cacheRet \
-            else self.cacheRet
-        # 合并各帧目标数据
-        cars = [car for frame in self.cache for car in frame]
-        aveCarNum = len(cars) / baseT
-        self.aveCarNum = aveCarNum
-        # 计算k(单位: veh/km)
-        self.k = aveCarNum / self.len * 1000
-        # 计算v(单位: m/s)
-        self.v = 0 if aveCarNum == 0 else \
-            abs(sum([car['vy'] for car in cars])) / len(cars)
-        # 计算q(单位: veh/h)
-        self.q = self.k * self.v * 3.6
+        n = len(vx)
+        self._lastN = n
+        if n == 0:      # 多数元胞每帧无车
+            self._lastHasFast = False
+        else:
+            # 每个元胞车辆数很少, 直接遍历比转为数组更快
+            vLat = self.vLat
+            self._lastHasFast = any(v > vLat or v < -vLat for v in vx)
+
+    @property
+    def q(self) -> float:
+        return self.lane.cellsQ[self.order].item()
+
+    @property
+    def k(self) -> float:
+        return self.lane.cellsK[self.order].item()
+
+    @property
+    def v(self) -> float:
+        return self.lane.cellsV[self.order].item()
+
+    @property
+    def aveCarNum(self) -> float:
+        return self.lane.cellsAveCarNum[self.order].item()
+
+    @property
+    def danger(self) -> float:
+        # 由两部分danger求和得到, 各处只需更新dangerTime与dangerChange
+        return self.dangerTime + self.dangerChange
+
+    @property
+    def r1(self) -> float:
+        return self.lane._r1List[self.order]
+
+    @property
+    def r2added(self) -> bool:
+        return bool(self.lane._r2added[self.order])
 
     def updateR1(self, q: float):
         '''function updateR1
@@ -150,8 +176,9 @@ class CellMng:
         将路段q数据传递给各个cell, 用于更新cell抛洒物置信度随时间增长的rate1。
         每次更新计算traffic后, 由trafficManager调用, 更新r1的新数据。
         计算方法: r1 = r1s * q / qs
+        整条车道的更新由laneMng.updateR1统一完成, 此处仅更新单个元胞。
         '''
-        self.r1 = self.r1s * q / self.qs
+        self.lane._r1List[self.order] = self._r1Factor * q
 
     def updateDanger(self) -> (bool, int):
         '''function _updateDanger
@@ -169,23 +196,16 @@ class CellMng:
         '''
         PossibleFrontSpill = False
         # 若最后一帧有车, 更新danger为0
-        if len(self.cache[-1]) != 0:
+        if self._lastN:
             self.dangerTime = 0.0
             self.dangerChange = 0.0
-            self.danger = 0.0
-            # 判断是否有车辆速度超限
-            for car in self.cache[-1]:
-                if abs(car['vx']) > self.vLat:
-                    PossibleFrontSpill = True
-                    return PossibleFrontSpill, self.order
+            # 是否有车辆速度超限已在updateLastFrame时确定
+            PossibleFrontSpill = self._lastHasFast
         else:
-            # 增加默认时间增长率
-            self.dangerTime += self.r1
-            # 但设置上限不可超出
-            if self.dangerTime > self.dangerTimeTop:
-                self.dangerTime = self.dangerTimeTop
-            # 更新danger
-            self.danger = self.dangerTime + self.dangerChange
+            # 增加默认时间增长率, 但设置上限不可超出
+            # 直接读取车道的r1列表, 省去每帧一次property调用
+            r1 = self.lane._r1List[self.order]
+            self.dangerTime = min(self.dangerTime + r1, self.dangerTimeTop)
         return PossibleFrontSpill, self.order
 
     def updateDangerPassive(self):
@@ -196,19 +216,19 @@ class CellMng:
         而updateDangerPassive为该元胞可能存在抛洒物时才会调用更新。
         在event detect 时发现该元胞前一些元胞有车辆横向速度过大时调用。
         '''
-        if not self.r2added:    # 已经被加过就不加了
+        r2added = self.lane._r2added
+        if not r2added[self.order]:     # 已经被加过就不加了
             # 更新换道danger
             self.dangerChange += self.r2
-            self.r2added = True
-            # 更新对外danger数值
-            self.danger = self.dangerTime + self.dangerChange
+            r2added[self.order] = True
 
     def resetCellDetermineStatus(self):
         '''function resetCellDetermineStatus
 
         重置cell的determine状态
+        整条车道的重置由laneMng.resetCellDetermineStatus一次完成, 此处仅重置单个元胞。
         '''
-        self.r2added = False
+        self.lane._r2added[self.order] = False
 
     def resetDanger(self):
         '''function resetDanger
@@ -217,4 +237,3 @@ class CellMng:
         '''
         self.dangerTime = 0.0
         self.dangerChange = 0.0
-        self.danger = 0.0
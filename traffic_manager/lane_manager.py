@@ -1,3 +1,4 @@
+import numpy as np
 from traffic_manager.cell_manager import CellMng
 from typing import Dict
 
@@ -7,7 +8,11 @@ class LaneMng:
     按照车道管理车道属性和交通流参数
     对外接口函数: `updateCache(cars)`, `updateTraffic(), updateDanger()`, 返回值为None。
     用于被上层trafficMng调用, 每帧将调用更新缓存, 每个指定时间更新traffic。
-    该2个函数的调用顺序不可颠倒, 内部实际为调用cell的2个更新函数。
+    updateCache更新车道的滑动窗口统计量, 并设置各元胞最新一帧的状态;
+    updateTraffic由统计量以数组运算一次算出车道及全部元胞的交通参数,
+    不再逐个调用元胞的更新函数。该2个函数的调用顺序不可颠倒。
+    每帧也可调用`updateStats(cars)`与`tick(vxByCell)`, 其中tick合并了
+    元胞最新帧状态更新与danger更新, 效果等同依次调用updateCache与updateDanger。
 
     Attributes
     ----------
@@ -35,6 +40,24 @@ class LaneMng:
         cache retention, 缓存保存时长, 单位: 帧
     cells: dict
         键为元胞序号order, 值为CellMng实例
+    cellsQ: np.ndarray
+        各元胞流量, shape=(元胞数,), 单位: 辆/小时
+    cellsK: np.ndarray
+        各元胞密度, shape=(元胞数,), 单位: 辆/公里
+    cellsV: np.ndarray
+        各元胞速度, shape=(元胞数,), 单位: m/s
+    cellsAveCarNum: np.ndarray
+        各元胞帧平均车辆数, shape=(元胞数,)
+    _frameSums: np.ndarray
+        环形缓冲, 各帧各元胞车辆vy之和, shape=(cacheRet, 元胞数)
+    _frameCounts: np.ndarray
+        环形缓冲, 各帧各元胞车辆数, shape=(cacheRet, 元胞数)
+    _head: int
+        环形缓冲下一帧的写入行, 写入前先从滑动窗口统计量中扣除该行
+    _r1List: list
+        各元胞置信度时间增长率r1, 长度为元胞数
+    _r2added: np.ndarray
+        各元胞当前帧r2是否已被加, shape=(元胞数,), dtype=bool
     q: float
         车道交通流量, 单位: 辆/小时
     k: float
@@ -46,13 +69,18 @@ class LaneMng:
     -------
     _initCells(cfg: dict) -> Dict[int, CellMng]
         初始化车道元胞
+    _initCellsArrays()
+        初始化按元胞组织的交通参数数组与滑动窗口统计量
     updateCache(cars: list)
         更新车道元胞缓存
+    updateCellsLastFrame(vxByCell: dict)
+        更新各元胞最新一帧的状态
     updateTraffic()
         更新车道交通流参数
-    _carsByCell(cars: list) -> dict
-        按照车道的start, end, cellLen,与车辆的YDecy属性,
-        确定车辆所在元胞序号, 并按元胞组织车辆。
+    updateStats(cars: list) -> dict
+        更新元胞滑动窗口统计量, 返回按元胞组织的车辆vx
+    tick(vxByCell: dict)
+        同时更新元胞最新帧状态与danger
     _carLocCell(car: dict) -> int
         根据车道的start, end, cellLen,与车辆的YDecy属性,
         确定车辆所在元胞序号。
@@ -92,7 +120,8 @@ class LaneMng:
         # 基础属性
         self.ID = ID
         self.emg = emg
-        self.len = len          # 暂无使用
+        self.len = len
+        self._kFactor = 1000.0 / len    # 由帧平均车辆数换算密度(veh/km)的系数
         self.start = start
         self.end = end          # 暂无使用
         self.vdir = vdir
@@ -106,6 +135,10 @@ class LaneMng:
         self.cellsValid = cellsValid
         self.cacheRet = cacheRet
         self.cells = self._initCells(cfg)
+        self._cellsList = list(self.cells.values())     # 每帧遍历用
+        # 预先划分可用元胞, 每帧仅遍历可用元胞, 无需逐个判断valid
+        self._activeCells = [cell for cell in self._cellsList if cell.valid]
+        self._initCellsArrays()
 
     def _initCells(self, cfg: dict) -> Dict[int, CellMng]:
         '''function _initCells
@@ -135,13 +168,49 @@ class LaneMng:
                                cfg['qStandard'],
                                cfg['rate2'],
                                cfg['vLateral'],
-                               self.cacheRet)
+                               self)
             # print([self.ID, i, self.cellsValid[i],
             #                    self.cellLen, start, end])
             start = end
             end = start + self.cellLen * self.vdir
         return cells
 
+    def _initCellsArrays(self):
+        '''function _initCellsArrays
+
+        初始化按元胞组织的交通参数数组与滑动窗口统计量。
+        整条车道各元胞的统计量存储为并列数组, 每帧以一次数组运算更新,
+        无需逐个元胞调用方法。
+        '''
+        cellNum = len(self.cells)
+        cellsLen = np.array([self.cells[order].len
+                             for order in self.cells], dtype=float)
+        # 预先计算各元胞由帧平均车辆数换算密度(veh/km)的系数
+        self._cellsKFactor = 1000.0 / cellsLen
+        # 滑动窗口统计量: 缓存内各元胞车辆vy之和与车辆总数
+        self._sumVy = np.zeros(cellNum)
+        self._nCars = np.zeros(cellNum, dtype=np.int64)
+        # 各帧的统计量, 环形缓冲一次分配, 每行为一帧, 写满后覆盖最旧帧,
+        # 覆盖前扣减该行, 每帧无需分配数组
+        cacheRet = int(self.cacheRet)
+        self._frameSums = np.zeros((cacheRet, cellNum))
+        self._frameCounts = np.zeros((cacheRet, cellNum), dtype=np.int32)
+        self._frameHasCars = [False] * cacheRet     # 各行是否非全零
+        self._head = 0          # 下一帧的写入行
+        self._frameNum = 0      # 缓冲中的帧数, 不超过cacheRet
+        # 元胞交通参数
+        self.cellsQ = np.zeros(cellNum)
+        self.cellsK = np.zeros(cellNum)
+        self.cellsV = np.zeros(cellNum)
+        self.cellsAveCarNum = np.zeros(cellNum)
+        # 元胞置信度时间增长率r1, 由车道统一更新
+        # 每帧按元胞读取, 以列表存储, 下标访问快于数组
+        self._r1Factors = [self.cells[order]._r1Factor
+                           for order in self.cells]
+        self._r1List = [0.0] * cellNum
+        # 各元胞当前帧r2是否已被加, 每帧整体重置
+        self._r2added = np.zeros(cellNum, dtype=np.bool_)
+
     def updateCache(self, cars: list):
         '''function updateCache
 
@@ -149,32 +218,120 @@ class LaneMng:
         -----
         cars: list
             车辆列表, 每个元素为一个dict, 代表一个车辆目标
-        t: int
-            接收到该数据的帧号, 作为键值索引缓存数据
 
-        更新车道元胞缓存
+        更新车道元胞缓存, 并更新各元胞的滑动窗口统计量
         '''
-        # 确定车辆所在元胞, 按元胞组织车辆
-        carsByCell = self._carsByCell(cars)
-        # 按元胞更新缓存
-        for order in self.cells:
-            self.cells[order].updateCache(carsByCell[order])
+        self.updateCellsLastFrame(self.updateStats(cars))
+
+    def updateCellsLastFrame(self, vxByCell: dict):
+        '''function updateCellsLastFrame
+
+        input
+        -----
+        vxByCell: dict
+            updateStats的返回值, 键为元胞序号order, 值为该元胞内车辆的vx列表
+
+        更新各元胞最新一帧的状态
+        '''
+        # 元胞状态仅用于danger判断, 不可用元胞不更新danger, 故无需更新
+        for cell in self._activeCells:
+            cell.updateLastFrame(vxByCell.get(cell.order, ()))
+
+    def updateStats(self, cars: list) -> dict:
+        '''function updateStats
+
+        input
+        -----
+        cars: list
+            车辆列表, 每个元素为一个dict, 代表一个车辆目标
+
+        return
+        ------
+        vxByCell: dict
+            键为元胞序号order, 值为该元胞内车辆的vx列表, 无车元胞不含键
+
+        更新各元胞的滑动窗口统计量, 并按元胞组织车辆vx, 供元胞缓存使用。
+        位于最后一个元胞之外(order >= 元胞数)的车辆不计入统计量,
+        也不会被任何元胞读取, 即被忽略而不报错。
+        '''
+        cellNum = len(self.cells)
+        # 确定车辆所在元胞, 按元胞组织车辆速度
+        # 每辆车的dict只在此处读取一次vx, vy, 之后仅操作数值列表
+        vxByCell = {}
+        vyByCell = {}
+        for car in cars:
+            order = self._carLocCell(car)
+            vx, vy = car['vx'], car['vy']
+            if order in vxByCell:
+                vxByCell[order].append(vx)
+                vyByCell[order].append(vy)
+            else:
+                vxByCell[order] = [vx]
+                vyByCell[order] = [vy]
+        # 写入行为最旧帧(缓冲未满时为全零行), 覆盖前先扣除其统计量
+        head = self._head
+        frameSums = self._frameSums[head]
+        frameCounts = self._frameCounts[head]
+        if self._frameHasCars[head]:
+            self._sumVy -= frameSums
+            self._nCars -= frameCounts
+            self._sumVy[self._nCars == 0] = 0.0     # 避免浮点误差累积
+            frameSums.fill(0.0)
+            frameCounts.fill(0)
+        # 当前帧各元胞的统计量, 无车帧保持全零行
+        if vyByCell:
+            for order, vys in vyByCell.items():
+                if order < cellNum:     # 超出车道元胞范围的车辆忽略
+                    frameSums[int(order)] = sum(vys)
+                    frameCounts[int(order)] = len(vys)
+            self._sumVy += frameSums
+            self._nCars += frameCounts
+        self._frameHasCars[head] = bool(vyByCell)
+        # 写入位置后移, 到达末尾后回到开头
+        head += 1
+        self._head = 0 if head == len(self._frameHasCars) else head
+        if self._frameNum < len(self._frameHasCars):
+            self._frameNum += 1
+        return vxByCell
+
+    def tick(self, vxByCell: dict):
+        '''function tick
+
+        input
+        -----
+        vxByCell: dict
+            updateStats的返回值, 键为元胞序号order, 值为该元胞内车辆的vx列表
+
+        每帧调用一次, 在一次遍历中对各可用元胞依次更新最新帧状态与danger,
+        效果等同依次调用updateCellsLastFrame与updateDanger。
+        '''
+        for cell in self._activeCells:
+            cell.updateLastFrame(vxByCell.get(cell.order, ()))
+            PossibleFrontSpill, order = cell.updateDanger()
+            if PossibleFrontSpill:
+                self._updateFrontDanger(order)
 
     def updateTraffic(self):
         '''function updateTraffic
         更新车道交通流参数
         '''
-        # 更新元胞交通流参数
-        for order in self.cells:
-            self.cells[order].updateTraffic()
+        # 以数组运算一次更新全部元胞交通流参数
+        baseT = self._frameNum  # 不超过cacheRet
+        aveCarNum = self._nCars / baseT
+        self.cellsAveCarNum = aveCarNum
+        # 计算k(单位: veh/km)
+        self.cellsK = aveCarNum * self._cellsKFactor
+        # 计算v(单位: m/s), 无车元胞速度为0
+        self.cellsV = np.divide(np.abs(self._sumVy), self._nCars,
+                                out=np.zeros(len(self._sumVy)),
+                                where=self._nCars != 0)
+        # 计算q(单位: veh/h)
+        self.cellsQ = self.cellsK * self.cellsV * 3.6
         # 更新车道交通流参数
-        aveCarNum = 0   # 按帧的平均车辆数
-        vSum = 0   # 车道平均速度
-        for order in self.cells:
-            aveCarNum += self.cells[order].aveCarNum
-            vSum += self.cells[order].v * self.cells[order].aveCarNum
-        self.k = aveCarNum / self.len * 1000
-        self.v = vSum / aveCarNum if aveCarNum != 0 else 0  # 加权求速度
+        aveCarNumSum = aveCarNum.sum().item()   # 按帧的平均车辆数
+        vSum = (self.cellsV * aveCarNum).sum().item()
+        self.k = aveCarNumSum * self._kFactor
+        self.v = vSum / aveCarNumSum if aveCarNumSum != 0 else 0  # 加权求速度
         self.q = self.k * self.v * 3.6
 
     def updateR1(self, q: float):
@@ -185,60 +342,42 @@ class LaneMng:
         q: float
             整个路段交通流量, 单位: 辆/小时
 
-        将路段q数据传递给各个cell, 用于更新cell抛洒物置信度随时间增长的rate1
+        将路段q数据传递给各个cell, 用于更新cell抛洒物置信度随时间增长的rate1。
+        各元胞r1 = r1s * q / qs, 由车道统一写入_r1List, 元胞的r1读取该列表。
         '''
-        for order in self.cells:
-            self.cells[order].updateR1(q)
+        self._r1List = [factor * q for factor in self._r1Factors]
 
     def updateDanger(self):
         '''function updateDanger
 
         更新cell的危险系数
         '''
-        for order in self.cells:
-            # 如果cell不可用, 则跳过, 不更新danger
-            if not self.cells[order].valid:
-                continue
+        # 仅遍历可用元胞, 不可用元胞不更新danger
+        for cell in self._activeCells:
             # 按时间增加r1, 并检查是否需要让前方cell增加r2
-            PossibleFrontSpill, _ = self.cells[order].updateDanger()
-            # 如果当前遍历的cell发现可能有抛洒物, 前方cell更新危险度+r2
+            PossibleFrontSpill, order = cell.updateDanger()
             if PossibleFrontSpill:
-                for frontOrder in self.cells:
-                    if frontOrder <= order:
-                        continue
-                    self.cells[frontOrder].updateDangerPassive()
-
-    def resetCellDetermineStatus(self):
-        '''function resetCellDetermineStatus
+                self._updateFrontDanger(order)
 
-        重置cell的determine状态
-        '''
-        for order in self.cells:
-            self.cells[order].resetCellDetermineStatus()
-
-    def _carsByCell(self, cars: list) -> dict:
-        '''function _carsByCell
+    def _updateFrontDanger(self, order: int):
+        '''function _updateFrontDanger
 
         input
         -----
-        cars: list
-            车辆列表, 每个元素为一个dict, 代表一个车辆目标
+        order: int
+            发现可能有抛洒物的元胞序号
 
-        return
-        ------
-        carsByCell: dict
-            键为元胞序号order, 值为所分配车辆的列表, 无车辆则为空列表
+        当前遍历的cell发现可能有抛洒物, 前方cell更新危险度+r2
+        '''
+        for frontCell in self._cellsList[order + 1:]:
+            frontCell.updateDangerPassive()
 
-        按照车道的start, end, cellLen,与车辆的YDecy属性,
-        确定车辆所在元胞序号, 并按元胞组织车辆。
+    def resetCellDetermineStatus(self):
+        '''function resetCellDetermineStatus
+
+        重置cell的determine状态
         '''
-        # 按cell的order为键值预生成字典
-        carsByCell = {i: [] for i in range(len(self.cells))}
-        # 遍历车辆确定元胞
-        for car in cars:
-            order = self._carLocCell(car)
-            carsByCell[order].append(car)
-        return carsByCell
+        self._r2added.fill(False)
 
     def _carLocCell(self, car: dict) -> int:
         '''function _carLocCell